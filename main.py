@@ -2,14 +2,27 @@
 import json
 from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import numpy as np
 import faiss
 import os
 import requests
+import sys
+import threading
 from openai import OpenAI
 import logging
+import base64
+import binascii
+import hashlib
+import io
+from collections import OrderedDict
 from fastapi import Body
+from PIL import Image
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
 from fastapi.responses import JSONResponse
 
 app = FastAPI()
@@ -23,24 +36,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load marks data from q-vercel-python.json
-with open("q-vercel-python.json", "r") as f:
-    marks_list = json.load(f)
-marks_data = {item["name"]: item["marks"] for item in marks_list}
-
-# Load FAISS index, embeddings, and metadata
-index = faiss.read_index("faiss_index.bin")
-embeddings = np.load("embeddings.npy")
-with open("metadatas.json", "r", encoding="utf-8") as f:
-    metadatas = json.load(f)
-rag_data_path = os.path.join('webscraper', 'rag_dataset.jsonl')
-rag_records = []
-with open(rag_data_path, 'r', encoding='utf-8') as f:
-    for line in f:
-        try:
-            rag_records.append(json.loads(line))
-        except Exception:
-            pass
+# Corpus registry: each tenant (course/term) maps to its own index bundle.
+# Bundles are loaded on first request and evicted LRU once the memory budget is exceeded.
+# The budget is approximate (FAISS vectors plus the parsed size of the JSON data) and a
+# soft limit: a new bundle is loaded before eviction runs, and an evicted bundle stays in
+# memory until in-flight requests holding it finish, so peak usage can exceed it.
+DEFAULT_CORPUS = os.getenv('DEFAULT_CORPUS', "default")
+CORPUS_MEMORY_MB = int(os.getenv('CORPUS_MEMORY_MB', "512"))
+corpus_registry = {
+    DEFAULT_CORPUS: {
+        "index": "faiss_index.bin",
+        "metadatas": "metadatas.json",
+        "records": os.path.join('webscraper', 'rag_dataset.jsonl'),
+    }
+}
+# Extra tenants come from a JSON file: {"<corpus>": {"index": ..., "metadatas": ..., "records": ...}}
+corpora_config = os.getenv('CORPORA_CONFIG', "")
+if corpora_config:
+    with open(corpora_config, "r", encoding="utf-8") as f:
+        extra_corpora = json.load(f)
+    for corpus_name, paths in extra_corpora.items():
+        missing = {"index", "metadatas", "records"} - set(paths)
+        if missing:
+            raise ValueError(f"{corpora_config}: corpus {corpus_name!r} is missing {sorted(missing)}")
+    corpus_registry.update(extra_corpora)
+loaded_corpora = OrderedDict()
+corpus_lock = threading.Lock()
+# Per-corpus locks so a cold load only blocks requests for that corpus
+corpus_load_locks = {}
+
+def deep_sizeof(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k) + deep_sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(v) for v in obj)
+    return size
+
+def load_corpus(paths):
+    index = faiss.read_index(paths["index"])
+    with open(paths["metadatas"], "r", encoding="utf-8") as f:
+        metadatas = json.load(f)
+    rag_records = []
+    with open(paths["records"], 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rag_records.append(json.loads(line))
+            except Exception:
+                pass
+    # Approximate footprint: the flat vectors plus the parsed Python objects
+    size = index.ntotal * index.d * 4
+    size += deep_sizeof(metadatas) + deep_sizeof(rag_records)
+    return {"index": index, "metadatas": metadatas, "rag_records": rag_records, "size": size}
+
+def get_corpus(name):
+    # Return the bundle for a corpus, loading it lazily; raises KeyError for unknown corpora.
+    if name not in corpus_registry:
+        raise KeyError(name)
+    paths = corpus_registry[name]
+    with corpus_lock:
+        if name in loaded_corpora:
+            loaded_corpora.move_to_end(name)
+            return loaded_corpora[name]
+        load_lock = corpus_load_locks.setdefault(name, threading.Lock())
+    with load_lock:
+        # Another request may have finished loading while we waited
+        with corpus_lock:
+            if name in loaded_corpora:
+                loaded_corpora.move_to_end(name)
+                return loaded_corpora[name]
+        bundle = load_corpus(paths)
+        # Insert before releasing load_lock so waiters see the bundle instead of reloading it
+        with corpus_lock:
+            loaded_corpora[name] = bundle
+            budget = CORPUS_MEMORY_MB * 1024 * 1024
+            # Evict least recently used bundles, but always keep the one just loaded
+            while len(loaded_corpora) > 1 and sum(b["size"] for b in loaded_corpora.values()) > budget:
+                evicted, _ = loaded_corpora.popitem(last=False)
+                logger.info(f"Evicted corpus: {evicted}")
+            logger.info(f"Loaded corpus: {name} ({bundle['size']} bytes, {len(loaded_corpora)} active)")
+            return bundle
 
 token = os.getenv('OPENAI_API_KEY', "")
 openai_client = OpenAI(api_key=token, base_url="https://aipipe.org/openai/v1")
@@ -48,7 +123,7 @@ openai_client = OpenAI(api_key=token, base_url="https://aipipe.org/openai/v1")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def retrieve_similar(query_embedding, metadatas, top_k=3):
+def retrieve_similar(index, query_embedding, metadatas, top_k=3):
     query_embedding = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
     D, I = index.search(query_embedding, top_k)
     results = []
@@ -61,15 +136,109 @@ def retrieve_similar(query_embedding, metadatas, top_k=3):
             })
     return results
 
+# Image pipeline settings
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', "1024"))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', "80"))
+IMAGE_CACHE_SIZE = int(os.getenv('IMAGE_CACHE_SIZE', "128"))
+# Decoded images larger than this are rejected before any image work
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(10 * 1024 * 1024)))
+# OCR needs the optional pytesseract package and the tesseract binary
+IMAGE_OCR = os.getenv('IMAGE_OCR', "1") == "1" and pytesseract is not None
+# OCR runs on a copy bounded to this side, so text stays legible without unbounded cost
+IMAGE_OCR_MAX_SIDE = int(os.getenv('IMAGE_OCR_MAX_SIDE', str(2 * IMAGE_MAX_SIDE)))
+# Cap on OCR characters added to the embedding input (ada-002 accepts ~8k tokens)
+IMAGE_OCR_MAX_CHARS = int(os.getenv('IMAGE_OCR_MAX_CHARS', "2000"))
+image_cache = OrderedDict()
+# prepare_image runs in worker threads
+image_cache_lock = threading.Lock()
+if IMAGE_OCR:
+    logger.info("Image OCR enabled for retrieval.")
+elif pytesseract is None:
+    logger.info("Image OCR disabled: pytesseract is not installed.")
+else:
+    logger.info("Image OCR disabled by IMAGE_OCR.")
+
+def prepare_image(img_b64):
+    # Decode, validate, downscale and re-encode a base64 image.
+    # Results are cached by content hash so repeated screenshots are only processed once.
+    if img_b64.startswith("data:"):
+        img_b64 = img_b64.split(",", 1)[-1]
+    # Accept GET values where '+' became ' ', line-wrapped and URL-safe base64
+    img_b64 = "".join(img_b64.replace(" ", "+").split())
+    img_b64 = img_b64.replace("-", "+").replace("_", "/")
+    img_b64 += "=" * (-len(img_b64) % 4)
+    if len(img_b64) // 4 * 3 > IMAGE_MAX_BYTES + 2:
+        raise ValueError(f"image larger than {IMAGE_MAX_BYTES} bytes")
+    try:
+        raw = base64.b64decode(img_b64, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"invalid base64 data: {e}")
+    if len(raw) > IMAGE_MAX_BYTES:
+        raise ValueError(f"image larger than {IMAGE_MAX_BYTES} bytes")
+    digest = hashlib.sha256(raw).hexdigest()
+    with image_cache_lock:
+        if digest in image_cache:
+            image_cache.move_to_end(digest)
+            logger.info(f"Image cache hit: {digest[:12]}")
+            return image_cache[digest]
+    try:
+        with Image.open(io.BytesIO(raw)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"unreadable image: {e}")
+    source_format = image.format
+    source_size = image.size
+    # OCR at a higher resolution than the vision copy; heavy downscaling hurts dense text
+    ocr_text = ""
+    if IMAGE_OCR:
+        ocr_image = image.copy()
+        ocr_image.thumbnail((IMAGE_OCR_MAX_SIDE, IMAGE_OCR_MAX_SIDE))
+        try:
+            ocr_text = " ".join(pytesseract.image_to_string(ocr_image).split())[:IMAGE_OCR_MAX_CHARS]
+        except Exception as e:
+            logger.warning(f"OCR failed: {e}")
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    buf = io.BytesIO()
+    image.save(buf, format="WEBP", quality=IMAGE_QUALITY)
+    encoded = buf.getvalue()
+    # Small webp inputs can grow when re-encoded; keep the original bytes
+    # only if they were already within the size bound
+    if source_format == "WEBP" and max(source_size) <= IMAGE_MAX_SIDE and len(raw) <= len(encoded):
+        encoded = raw
+    entry = {
+        "hash": digest,
+        "b64": base64.b64encode(encoded).decode("ascii"),
+        "ocr_text": ocr_text,
+    }
+    with image_cache_lock:
+        image_cache[digest] = entry
+        if len(image_cache) > IMAGE_CACHE_SIZE:
+            image_cache.popitem(last=False)
+    logger.info(f"Image processed: {len(raw)} -> {len(encoded)} bytes, {len(ocr_text)} OCR chars.")
+    return entry
+
 class QARequest(BaseModel):
     question: str
     image: str = None
 
 
 
+@app.api_route("/api/{corpus_name}/", methods=["POST", "GET"])
+async def answer_corpus_question(corpus_name: str, request: QARequest = Body(None), question: str = Query(None),
+                                 image: str = Query(None)):
+    return await answer(corpus_name, request, question, image)
+
 @app.api_route("/api/", methods=["POST", "GET"])
 @app.api_route("/", methods=["POST", "GET"])
-async def answer_question(request: QARequest = Body(None), question: str = Query(None), image: str = Query(None)):
+async def answer_question(request: QARequest = Body(None), question: str = Query(None), image: str = Query(None),
+                          corpus: str = Query(None)):
+    return await answer(corpus or DEFAULT_CORPUS, request, question, image)
+
+async def answer(name, request, question, image):
     # Support both POST (with JSON body) and GET (with query params)
     if request is not None:
         query = request.question
@@ -78,16 +247,35 @@ async def answer_question(request: QARequest = Body(None), question: str = Query
         query = question
         img = image
 
-    logger.info(f"Received question: {query}")
+    logger.info(f"Received question for corpus {name}: {query}")
+    if name not in corpus_registry:
+        logger.error(f"Unknown corpus: {name}")
+        return {"answer": f"Unknown corpus: {name}", "links": []}
+    try:
+        bundle = await run_in_threadpool(get_corpus, name)
+    except Exception as e:
+        logger.error(f"Error loading corpus {name}: {e}")
+        return {"answer": f"Corpus error: {e}", "links": []}
+    metadatas = bundle["metadatas"]
+    rag_records = bundle["rag_records"]
+    image_entry = None
     if img:
         logger.info("Image provided with the request.")
+        try:
+            image_entry = await run_in_threadpool(prepare_image, img)
+        except ValueError as e:
+            logger.error(f"Error processing image: {e}")
+            return {"answer": f"Image error: {e}", "links": []}
     else:
         logger.info("No image provided.")
 
-    # Step 1: Get embedding for the question
+    # Step 1: Get embedding for the question (plus any text extracted from the image)
+    retrieval_query = query
+    if image_entry and image_entry["ocr_text"]:
+        retrieval_query = f"{query}\n{image_entry['ocr_text']}"
     try:
         query_embedding = openai_client.embeddings.create(
-            input=query,
+            input=retrieval_query,
             model="text-embedding-ada-002"
         ).data[0].embedding
         logger.info("Query embedding generated successfully.")
@@ -96,7 +284,7 @@ async def answer_question(request: QARequest = Body(None), question: str = Query
         return {"answer": f"Embedding error: {e}", "links": []}
     # Step 2: Retrieve similar contexts
     try:
-        faiss_results = retrieve_similar(query_embedding, metadatas, top_k=2)
+        faiss_results = retrieve_similar(bundle["index"], query_embedding, metadatas, top_k=2)
         logger.info(f"Retrieved {len(faiss_results)} similar contexts from FAISS.")
     except Exception as e:
         logger.error(f"Error retrieving similar contexts: {e}")
@@ -119,10 +307,10 @@ async def answer_question(request: QARequest = Body(None), question: str = Query
         {"role": "system", "content": "You are a helpful assistant for the IITM TDS course."},
         {"role": "user", "content": grounded_prompt}
     ]
-    if img:
+    if image_entry:
         messages[-1]["content"] = [
             {"type": "text", "text": grounded_prompt},
-            {"type": "image_url", "image_url": {"url": f"data:image/webp;base64,{img}"}}
+            {"type": "image_url", "image_url": {"url": f"data:image/webp;base64,{image_entry['b64']}"}}
         ]
     data = {
         "model": "gpt-4o-mini",